@@ -1,9 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response, g, has_request_context
 import json
+import logging
 import os
 from datetime import datetime, timedelta
 import hashlib
+import hmac
+import functools
+import bcrypt
+import threading
 from calendar import monthrange
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+LOG_LEVEL = os.environ.get('LOGLEVEL', 'WARNING').upper()
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    LOG_LEVEL = 'WARNING'
+logging.basicConfig(level=LOG_LEVEL)
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here-change-this-in-production'
@@ -23,117 +45,341 @@ os.makedirs(BASE_DIR, exist_ok=True)
 USERS_FILE = os.path.join(BASE_DIR, 'users.json')
 LOGS_FILE = os.path.join(BASE_DIR, 'logs.json')
 
-print(f"Data directory: {BASE_DIR}")
-print(f"Users file: {USERS_FILE}")
-print(f"Logs file: {LOGS_FILE}")
+# Daily logs are stored per user in LOGS_DIR/<user_id>.jsonl, one change
+# record per line; LOGS_FILE and LOGS_DIR/<user_id>.json are only read once
+# to migrate data written by older versions
+LOGS_DIR = os.path.join(BASE_DIR, 'logs')
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+log.info("Data directory: %s", BASE_DIR)
+log.info("Users file: %s", USERS_FILE)
+log.info("Logs directory: %s", LOGS_DIR)
+
+def get_log_path(user_id):
+    # user_id comes from the session; never let it point outside LOGS_DIR
+    if not user_id or os.path.basename(user_id) != user_id or user_id in ('.', '..'):
+        raise ValueError(f"Invalid user id: {user_id!r}")
+    return os.path.join(LOGS_DIR, f'{user_id}.jsonl')
+
+def _json_loads(raw):
+    """Parse JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _json_dumps(data, indent=True):
+    """Serialize data to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(data, indent=2 if indent else None).encode()
+
+# Parsed JSON keyed by file path: (mtime, size, data)
+_JSON_CACHE = {}
+
+# Serializes changes to the cached data and the files behind it
+_WRITE_LOCK = threading.RLock()
+
+# Email lookups for the loaded users dict: (users, email_index, parent_email_index)
+_EMAIL_INDEX = (None, {}, {})
 
 def load_json(file):
+    """Load JSON data from file, at most once per request"""
+    if not has_request_context():
+        return _read_json(file)
+    if file not in g.loaded_json:
+        g.loaded_json[file] = _read_json(file)
+    return g.loaded_json[file]
+
+def _read_json(file):
     """Load JSON data from file, create file if it doesn't exist"""
     try:
         if os.path.exists(file):
-            with open(file, 'r') as f:
-                return json.load(f)
+            st = os.stat(file)
+            entry = _JSON_CACHE.get(file)
+            if entry and entry[0] == st.st_mtime and entry[1] == st.st_size:
+                return entry[2]
+            with open(file, 'rb') as f:
+                data = _json_loads(f.read())
+            _JSON_CACHE[file] = (st.st_mtime, st.st_size, data)
+            return data
         else:
             # Create empty file if it doesn't exist
-            print(f"Creating new file: {file}")
-            with open(file, 'w') as f:
-                json.dump({}, f)
+            log.debug("Creating new file: %s", file)
+            with open(file, 'wb') as f:
+                f.write(_json_dumps({}))
             return {}
     except (json.JSONDecodeError, IOError) as e:
-        print(f"Error loading {file}: {e}")
+        log.error("Error loading %s: %s", file, e)
         # Return empty dict and recreate file
         try:
-            with open(file, 'w') as f:
-                json.dump({}, f)
+            with open(file, 'wb') as f:
+                f.write(_json_dumps({}))
             return {}
         except Exception as e2:
-            print(f"Critical error creating file {file}: {e2}")
+            log.error("Critical error creating file %s: %s", file, e2)
             return {}
 
+def get_top_level_keys(file):
+    """List the keys of a JSON object file, streaming it with ijson unless a fresh parse is cached"""
+    entry = _JSON_CACHE.get(file)
+    try:
+        st = os.stat(file)
+    except OSError:
+        st = None
+    if st is not None and entry and entry[0] == st.st_mtime and entry[1] == st.st_size:
+        return list(entry[2].keys())
+    if st is not None and ijson is not None:
+        try:
+            with open(file, 'rb') as f:
+                return [value for prefix, event, value in ijson.parse(f)
+                        if prefix == '' and event == 'map_key']
+        except (ijson.JSONError, OSError) as e:
+            log.warning("Could not stream %s, loading it instead: %s", file, e)
+    return list(load_json(file).keys())
+
+def write_file_atomic(file, payload):
+    """Replace file with payload via a temp file, so a crash never leaves it truncated"""
+    tmp_file = f"{file}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_file, 'wb', buffering=1 << 16) as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, file)
+    except BaseException:
+        # Don't leave a stray temp file behind for every failed attempt
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        raise
+
 def save_json(file, data):
     """Save JSON data to file with error handling"""
     try:
         # Ensure directory exists
         os.makedirs(os.path.dirname(file), exist_ok=True)
         
-        # Save new data
-        with open(file, 'w') as f:
-            json.dump(data, f, indent=4)
+        write_file_atomic(file, _json_dumps(data))
         
-        print(f"Data successfully saved to {file}")
+        # Refresh the cache so the next read skips the disk
+        st = os.stat(file)
+        _JSON_CACHE[file] = (st.st_mtime, st.st_size, data)
+        
+        log.debug("Data successfully saved to %s", file)
+        return True
+    except Exception as e:
+        log.error("Error saving to %s: %s", file, e)
+        return False
+
+def get_data_version(file):
+    """Return a value that changes whenever the data stored for file changes"""
+    try:
+        st = os.stat(file)
+        return st.st_mtime, st.st_size
+    except OSError:
+        return None
+
+def apply_log_record(user_logs, record):
+    """Fold one log record (a whole day, or one "section.key" field) into the logs"""
+    date = record['date']
+    if 'log' in record:
+        user_logs[date] = record['log']
+        return
+    
+    if date not in user_logs:
+        user_logs[date] = initialize_daily_log()
+    section, _, key = record['field'].partition('.')
+    if key:
+        user_logs[date].setdefault(section, {})[key] = record['value']
+    else:
+        user_logs[date][section] = record['value']
+
+def load_user_logs(user_id):
+    """Load a user's daily logs by replaying their log file"""
+    file = get_log_path(user_id)
+    try:
+        st = os.stat(file)
+    except OSError:
+        return {}
+    
+    entry = _JSON_CACHE.get(file)
+    if entry and entry[0] == st.st_mtime and entry[1] == st.st_size:
+        return entry[2]
+    
+    user_logs = {}
+    try:
+        with open(file, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    apply_log_record(user_logs, _json_loads(line))
+                except (ValueError, KeyError) as e:
+                    # e.g. a line cut short by a crash while appending
+                    log.warning("Skipping bad record in %s: %s", file, e)
+    except IOError as e:
+        log.error("Error loading %s: %s", file, e)
+        return {}
+    
+    _JSON_CACHE[file] = (st.st_mtime, st.st_size, user_logs)
+    return user_logs
+
+def append_log_records(user_id, records):
+    """Append records to a user's log file and apply them to the cached logs"""
+    file = get_log_path(user_id)
+    try:
+        with _WRITE_LOCK:
+            user_logs = load_user_logs(user_id)
+            with open(file, 'ab') as f:
+                f.write(b''.join(_json_dumps(record, indent=False) + b'\n'
+                                 for record in records))
+            
+            # Keep the cache in step so the next read doesn't replay the file
+            for record in records:
+                apply_log_record(user_logs, record)
+            st = os.stat(file)
+            _JSON_CACHE[file] = (st.st_mtime, st.st_size, user_logs)
+        return True
+    except Exception as e:
+        log.error("Error appending to %s: %s", file, e)
+        return False
+
+def compact_user_logs(user_id, user_logs):
+    """Rewrite a user's log file with a single record per day"""
+    file = get_log_path(user_id)
+    try:
+        with _WRITE_LOCK:
+            write_file_atomic(file, b''.join(
+                _json_dumps({'date': date, 'log': log_data}, indent=False) + b'\n'
+                for date, log_data in user_logs.items()))
+            st = os.stat(file)
+            _JSON_CACHE[file] = (st.st_mtime, st.st_size, user_logs)
+        log.debug("Compacted logs for user: %s", user_id)
         return True
     except Exception as e:
-        print(f"Error saving to {file}: {e}")
+        log.error("Error compacting %s: %s", file, e)
         return False
 
+def get_email_index(users):
+    """Return the email -> user_id and parent_email -> user_id maps for users"""
+    global _EMAIL_INDEX
+    with _WRITE_LOCK:
+        if _EMAIL_INDEX[0] is not users:
+            email_index = {}
+            parent_email_index = {}
+            for user_id, user_data in users.items():
+                email_index.setdefault(user_data.get('email'), user_id)
+                parent_email_index.setdefault(user_data.get('parent_email'), user_id)
+            _EMAIL_INDEX = (users, email_index, parent_email_index)
+        return _EMAIL_INDEX[1], _EMAIL_INDEX[2]
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode()
+
+def is_legacy_hash(stored_hash):
+    """Older accounts store an unsalted SHA-256 hex digest instead of a bcrypt hash"""
+    return not stored_hash.startswith('$2')
+
+def check_password(password, stored_hash):
+    """Check password against a stored bcrypt hash or legacy SHA-256 digest"""
+    if not stored_hash:
+        return False
+    if is_legacy_hash(stored_hash):
+        legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy_hash, stored_hash)
+    return bcrypt.checkpw(password.encode(), stored_hash.encode())
 
 def get_current_time():
-    return datetime.now().strftime('%H:%M')
+    return g.now_hm
+
+# Empty daily log; initialize_daily_log hands out copies of it
+_DAILY_LOG_TEMPLATE = {
+    'meals': {
+        'morning': '',
+        'afternoon': '', 
+        'evening': '',
+        'dinner_snacks': ''
+    },
+    'water_ml': 0,
+    'sleep_hours': 0,
+    'tasks': '',
+    'period': {
+        'start': '',
+        'end': '',
+        'notes': ''
+    },
+    'last_updated': {
+        'breakfast': '',
+        'lunch': '',
+        'evening': '',
+        'dinner': '',
+        'water': '',
+        'sleep': '',
+        'tasks': '',
+        'period': ''
+    }
+}
 
 def initialize_daily_log():
+    # Only the nested sections are mutable, so copying those is enough
+    # (and cheaper than copy.deepcopy or rebuilding the literal)
     return {
-        'meals': {
-            'morning': '',
-            'afternoon': '', 
-            'evening': '',
-            'dinner_snacks': ''
-        },
-        'water_ml': 0,
-        'sleep_hours': 0,
-        'tasks': '',
-        'period': {
-            'start': '',
-            'end': '',
-            'notes': ''
-        },
-        'last_updated': {
-            'breakfast': '',
-            'lunch': '',
-            'evening': '',
-            'dinner': '',
-            'water': '',
-            'sleep': '',
-            'tasks': '',
-            'period': ''
-        }
+        **_DAILY_LOG_TEMPLATE,
+        'meals': _DAILY_LOG_TEMPLATE['meals'].copy(),
+        'period': _DAILY_LOG_TEMPLATE['period'].copy(),
+        'last_updated': _DAILY_LOG_TEMPLATE['last_updated'].copy()
     }
 
-def calculate_period_calendar(period_history, cycle_length=28, period_duration=5, months=6):
-    """Calculate period dates for calendar display for multiple months"""
-    if len(period_history) < 1:
-        return []
-    
-    # Get all period start dates
+def get_period_start_dates(starts):
+    """Parse period start strings into a sorted datetime64[D] array"""
     period_dates = []
-    for period in period_history:
+    for start in starts:
         try:
-            start_date = datetime.strptime(period['start'], '%Y-%m-%d')
-            period_dates.append(start_date)
-        except:
+            period_dates.append(datetime.strptime(start, '%Y-%m-%d'))
+        except (TypeError, ValueError):
             continue
     
+    dates = np.array(period_dates, dtype='datetime64[D]')
+    dates.sort()
+    return dates
+
+@functools.lru_cache(maxsize=1024)
+def predict_period_days(last_period_start, cycle_length, period_duration, months):
+    """Return (date, month, year, cycle_number) for every predicted period day"""
+    # Lay out every predicted period window (based on user's average period
+    # duration) in one array: one row per cycle, one column per day
+    last_period = np.datetime64(last_period_start, 'D')
+    cycle_starts = last_period + np.arange(1, months + 1) * cycle_length
+    period_days = cycle_starts[:, np.newaxis] + np.arange(period_duration)
+    
+    days = []
+    for i, cycle_days in enumerate(period_days.tolist()):
+        for period_date in cycle_days:
+            days.append((period_date.strftime('%Y-%m-%d'), period_date.month,
+                         period_date.year, i + 1))
+    return tuple(days)
+
+def calculate_period_calendar(period_dates, cycle_length=28, period_duration=5, months=6):
+    """Calculate period dates for calendar display for multiple months"""
     if len(period_dates) < 1:
         return []
     
-    # Use the last period as reference
-    last_period = period_dates[-1]
+    # Use the last period as reference; the predicted days only depend on
+    # these scalars, so they are cached
+    last_period_start = str(period_dates[-1])
     
     # Generate predictions for next months
     predictions = []
     
-    for i in range(months):
-        next_period = last_period + timedelta(days=cycle_length * (i + 1))
-        # Add period window (based on user's average period duration)
-        for day in range(period_duration):
-            period_date = next_period + timedelta(days=day)
-            predictions.append({
-                'date': period_date.strftime('%Y-%m-%d'),
-                'month': period_date.month,
-                'year': period_date.year,
-                'cycle_number': i + 1
-            })
+    for date, month, year, cycle_number in predict_period_days(
+            last_period_start, cycle_length, period_duration, months):
+        predictions.append({
+            'date': date,
+            'month': month,
+            'year': year,
+            'cycle_number': cycle_number
+        })
     
     return predictions
 
@@ -154,27 +400,8 @@ def get_period_delay(next_period_prediction):
     
     return None
 
-def calculate_cycle_analysis(period_history):
+def calculate_cycle_analysis(period_dates):
     """Calculate cycle statistics and predictions"""
-    if len(period_history) < 2:
-        return {
-            'cycle_length': 28,
-            'period_duration': 5,
-            'cycle_regularity': 'Insufficient data',
-            'next_ovulation': 'Need more data',
-            'fertile_window': 'Need more data',
-            'last_period_start': period_history[0]['start'] if period_history else 'No data'
-        }
-    
-    # Get all period start dates
-    period_dates = []
-    for period in period_history:
-        try:
-            start_date = datetime.strptime(period['start'], '%Y-%m-%d')
-            period_dates.append(start_date)
-        except:
-            continue
-    
     if len(period_dates) < 2:
         return {
             'cycle_length': 28,
@@ -182,20 +409,16 @@ def calculate_cycle_analysis(period_history):
             'cycle_regularity': 'Insufficient data',
             'next_ovulation': 'Need more data',
             'fertile_window': 'Need more data',
-            'last_period_start': period_history[0]['start'] if period_history else 'No data'
+            'last_period_start': str(period_dates[0]) if len(period_dates) else 'No data'
         }
     
     # Calculate average cycle length
-    period_dates.sort()
-    differences = []
-    for i in range(1, len(period_dates)):
-        diff = (period_dates[i] - period_dates[i-1]).days
-        differences.append(diff)
+    differences = np.diff(period_dates).astype(np.int64)
     
-    avg_cycle = sum(differences) // len(differences)
+    avg_cycle = int(differences.sum() // differences.size)
     
     # Calculate cycle regularity
-    cycle_variance = max(differences) - min(differences)
+    cycle_variance = int(differences.max() - differences.min())
     if cycle_variance <= 3:
         regularity = 'Very Regular'
     elif cycle_variance <= 7:
@@ -206,7 +429,7 @@ def calculate_cycle_analysis(period_history):
         regularity = 'Irregular'
     
     # Calculate ovulation and fertile window
-    last_period = period_dates[-1]
+    last_period = period_dates[-1].item()
     next_period = last_period + timedelta(days=avg_cycle)
     
     # Ovulation typically occurs 14 days before next period
@@ -226,21 +449,110 @@ def calculate_cycle_analysis(period_history):
         'last_period_start': last_period.strftime('%Y-%m-%d')
     }
 
+@functools.lru_cache(maxsize=256)
+def get_period_bundle(user_id, logs_version):
+    """Calculate period predictions for a user, cached per logs_version"""
+    user_logs = load_user_logs(user_id)
+    
+    # Snapshot the days under the lock; update_log may be adding one
+    with _WRITE_LOCK:
+        days = list(user_logs.values())
+    
+    # Parse the period history once and share it between the calculations
+    period_starts = [log_data['period']['start'] for log_data in days
+                     if log_data['period']['start']]
+    period_dates = get_period_start_dates(period_starts)
+    
+    cycle_analysis = calculate_cycle_analysis(period_dates)
+    next_period_prediction = predict_next_period(period_dates, cycle_analysis['cycle_length'])
+    period_calendar = calculate_period_calendar(
+        period_dates, 
+        cycle_analysis['cycle_length'], 
+        cycle_analysis['period_duration']
+    )
+    return cycle_analysis, next_period_prediction, period_calendar
+
+def read_legacy_logs(file):
+    """Read a logs file written by an older version, or None if it is gone or unreadable"""
+    try:
+        with open(file, 'rb') as f:
+            return _json_loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (ValueError, IOError) as e:
+        log.error("Error loading %s, not migrating it: %s", file, e)
+        return None
+
+def rename_migrated(file):
+    """Move a migrated file aside, unless another worker already did"""
+    try:
+        os.replace(file, file + '.migrated')
+    except FileNotFoundError:
+        pass
+
 def initialize_data_files():
     """Initialize data files if they don't exist"""
-    print(f"Initializing data files in: {BASE_DIR}")
+    log.info("Initializing data files in: %s", BASE_DIR)
     
     # Initialize users file
     users_data = load_json(USERS_FILE)
-    print(f"Users data loaded: {len(users_data)} users")
-    
-    # Initialize logs file
-    logs_data = load_json(LOGS_FILE)
-    print(f"Logs data loaded: {len(logs_data)} user logs")
+    log.info("Users data loaded: %s users", len(users_data))
+    
+    # Split the old shared logs file into per-user log files. Several
+    # workers may start at once, so another one can migrate a file first.
+    logs_data = read_legacy_logs(LOGS_FILE)
+    if logs_data is not None:
+        log.info("Migrating logs for %s users to: %s", len(logs_data), LOGS_DIR)
+        migrated = True
+        for user_id, user_logs in logs_data.items():
+            if not os.path.exists(get_log_path(user_id)):
+                migrated = compact_user_logs(user_id, user_logs) and migrated
+        if migrated:
+            rename_migrated(LOGS_FILE)
+    
+    # Convert per-user JSON files into log files
+    for name in os.listdir(LOGS_DIR):
+        if name.endswith('.json'):
+            user_id = name[:-len('.json')]
+            json_file = os.path.join(LOGS_DIR, name)
+            if os.path.exists(get_log_path(user_id)):
+                rename_migrated(json_file)
+                continue
+            user_logs = read_legacy_logs(json_file)
+            if user_logs is not None and compact_user_logs(user_id, user_logs):
+                rename_migrated(json_file)
+    
+    log_files = [name for name in os.listdir(LOGS_DIR) if name.endswith('.jsonl')]
+    log.info("Logs data loaded: %s user logs", len(log_files))
 
 # Initialize data files when module loads
 initialize_data_files()
 
+def upgrade_password_hash(users, user_id, field, password):
+    """Re-hash a legacy SHA-256 password with bcrypt after a successful login"""
+    if is_legacy_hash(users[user_id][field]):
+        # bcrypt is slow; don't hold up other writers while hashing
+        new_hash = hash_password(password)
+        with _WRITE_LOCK:
+            old_hash = users[user_id][field]
+            users[user_id][field] = new_hash
+            if not save_json(USERS_FILE, users):
+                users[user_id][field] = old_hash
+                return
+        log.debug("Upgraded %s hash for user: %s", field, user_id)
+
+@app.before_request
+def stamp_request_time():
+    """Read the clock once per request"""
+    g.now = datetime.now()
+    g.today = g.now.strftime('%Y-%m-%d')
+    g.now_hm = g.now.strftime('%H:%M')
+
+@app.before_request
+def reset_loaded_json():
+    """Start each request with an empty load_json lookup table"""
+    g.loaded_json = {}
+
 @app.route('/')
 def index():
     return redirect(url_for('login'))
@@ -253,25 +565,30 @@ def login():
         is_parent = 'parent_login' in request.form
         
         users = load_json(USERS_FILE)
-        print(f"Login attempt - Email: {email}, Is Parent: {is_parent}, Total users: {len(users)}")
+        log.debug("Login attempt - Email: %s, Is Parent: %s, Total users: %s", email, is_parent, len(users))
         
-        for user_id, user_data in users.items():
-            if is_parent:
-                if (user_data.get('parent_email') == email and 
-                    user_data.get('parent_password') == hash_password(password)):
-                    session['parent_user_id'] = user_id
-                    session['is_parent'] = True
-                    print(f"Parent login successful for user: {user_id}")
-                    return redirect(url_for('parent_dashboard'))
-            else:
-                if (user_data.get('email') == email and 
-                    user_data.get('password') == hash_password(password)):
-                    session['user_id'] = user_id
-                    session['is_parent'] = False
-                    print(f"User login successful for user: {user_id}")
-                    return redirect(url_for('dashboard'))
+        email_index, parent_email_index = get_email_index(users)
         
-        print("Login failed - invalid credentials")
+        if is_parent:
+            user_id = parent_email_index.get(email)
+            if (user_id is not None and 
+                check_password(password, users[user_id].get('parent_password'))):
+                upgrade_password_hash(users, user_id, 'parent_password', password)
+                session['parent_user_id'] = user_id
+                session['is_parent'] = True
+                log.debug("Parent login successful for user: %s", user_id)
+                return redirect(url_for('parent_dashboard'))
+        else:
+            user_id = email_index.get(email)
+            if (user_id is not None and 
+                check_password(password, users[user_id].get('password'))):
+                upgrade_password_hash(users, user_id, 'password', password)
+                session['user_id'] = user_id
+                session['is_parent'] = False
+                log.debug("User login successful for user: %s", user_id)
+                return redirect(url_for('dashboard'))
+        
+        log.debug("Login failed - invalid credentials")
         return render_template('login.html', error='Invalid credentials')
     
     return render_template('login.html')
@@ -280,16 +597,16 @@ def login():
 def register():
     if request.method == 'POST':
         users = load_json(USERS_FILE)
-        print(f"Registration attempt - Email: {request.form['email']}")
+        log.debug("Registration attempt - Email: %s", request.form['email'])
         
         # Check if email already exists
-        for user_id, user_data in users.items():
-            if user_data.get('email') == request.form['email']:
-                print("Registration failed - email already exists")
-                return render_template('register.html', error='Email already registered')
-            if user_data.get('parent_email') == request.form['parent_email']:
-                print("Registration failed - parent email already exists")
-                return render_template('register.html', error='Parent email already registered')
+        email_index, parent_email_index = get_email_index(users)
+        if request.form['email'] in email_index:
+            log.debug("Registration failed - email already exists")
+            return render_template('register.html', error='Email already registered')
+        if request.form['parent_email'] in parent_email_index:
+            log.debug("Registration failed - parent email already exists")
+            return render_template('register.html', error='Parent email already registered')
         
         user_data = {
             'name': request.form['name'],
@@ -300,80 +617,57 @@ def register():
             'parent_name': request.form['parent_name'],
             'parent_email': request.form['parent_email'],
             'parent_password': hash_password(request.form['parent_password']),
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'created_at': g.now.strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        user_id = f"user_{len(users) + 1}"
-        users[user_id] = user_data
-        
-        # Save user data
-        if save_json(USERS_FILE, users):
-            print(f"User saved successfully: {user_id}")
-            # Create initial log entry
-            logs = load_json(LOGS_FILE)
-            logs[user_id] = {
-                datetime.now().strftime('%Y-%m-%d'): initialize_daily_log()
-            }
-            if save_json(LOGS_FILE, logs):
-                print(f"Initial logs created for user: {user_id}")
-                return redirect(url_for('login'))
-            else:
-                print("Error creating user logs")
+        with _WRITE_LOCK:
+            # Check again: another registration may have finished while we
+            # hashed, so bypass this request's load_json lookup table
+            users = _read_json(USERS_FILE)
+            email_index, parent_email_index = get_email_index(users)
+            if user_data['email'] in email_index:
+                log.debug("Registration failed - email already exists")
+                return render_template('register.html', error='Email already registered')
+            if user_data['parent_email'] in parent_email_index:
+                log.debug("Registration failed - parent email already exists")
+                return render_template('register.html', error='Parent email already registered')
+            
+            user_id = f"user_{len(users) + 1}"
+            
+            # Ids can be reused (e.g. after users.json was reset), so start the
+            # new user with an empty log file rather than a previous user's
+            if not compact_user_logs(user_id, {}):
                 return render_template('register.html', error='Error creating user logs')
-        else:
-            print("Error saving user data")
-            return render_template('register.html', error='Error saving user data')
+            
+            users[user_id] = user_data
+            if not save_json(USERS_FILE, users):
+                del users[user_id]
+                log.error("Error saving user data")
+                return render_template('register.html', error='Error saving user data')
+            email_index[user_data['email']] = user_id
+            parent_email_index[user_data['parent_email']] = user_id
+            log.debug("User saved successfully: %s", user_id)
+        
+        return redirect(url_for('login'))
     
     return render_template('register.html')
 
-@app.route('/dashboard')
-def dashboard():
-    if 'user_id' not in session or session.get('is_parent'):
-        return redirect(url_for('login'))
-    
+@functools.lru_cache(maxsize=128)
+def render_dashboard(template, user_id, today, users_version, logs_version):
+    """Render a dashboard page, cached per user and data version"""
     users = load_json(USERS_FILE)
-    logs = load_json(LOGS_FILE)
-    
-    user_id = session['user_id']
-    today = datetime.now().strftime('%Y-%m-%d')
+    user_logs = load_user_logs(user_id)
     
-    print(f"Dashboard accessed - User: {user_id}, Today: {today}")
+    today_log = user_logs.get(today) or initialize_daily_log()
     
-    if user_id not in logs:
-        logs[user_id] = {}
-        print(f"Created new logs entry for user: {user_id}")
-    
-    if today not in logs[user_id]:
-        logs[user_id][today] = initialize_daily_log()
-        print(f"Created new daily log for: {today}")
-    
-    if not save_json(LOGS_FILE, logs):
-        print("Warning: Failed to save logs updates")
-    
-    # Calculate water percentage
-    water_percentage = min((logs[user_id][today]['water_ml'] / 4000) * 100, 100)
-    
-    # Get period history for predictions
-    period_history = []
-    period_calendar = []
-    period_delay = None
-    cycle_analysis = {}
+    # Calculate water percentage against the 4000ml daily goal
+    water_ml = today_log.get('water_ml', 0)
+    water_percentage = 100 if water_ml >= 4000 else water_ml / 40
     
+    # Get period predictions, cached until the user's logs change
     if users[user_id].get('gender') == 'female':
-        for date, log_data in logs[user_id].items():
-            if log_data['period']['start']:
-                period_history.append({
-                    'date': date,
-                    'start': log_data['period']['start']
-                })
-        
-        cycle_analysis = calculate_cycle_analysis(period_history)
-        next_period_prediction = predict_next_period(period_history, cycle_analysis['cycle_length'])
-        period_calendar = calculate_period_calendar(
-            period_history, 
-            cycle_analysis['cycle_length'], 
-            cycle_analysis['period_duration']
-        )
+        cycle_analysis, next_period_prediction, period_calendar = get_period_bundle(
+            user_id, logs_version)
         period_delay = get_period_delay(next_period_prediction)
     else:
         next_period_prediction = None
@@ -381,9 +675,9 @@ def dashboard():
         period_delay = None
         cycle_analysis = {}
     
-    return render_template('dashboard.html', 
+    return render_template(template,
                          user=users[user_id],
-                         today_log=logs[user_id][today],
+                         today_log=today_log,
                          water_percentage=water_percentage,
                          next_period_prediction=next_period_prediction,
                          period_calendar=period_calendar,
@@ -395,68 +689,50 @@ def dashboard():
                          fertile_window=cycle_analysis.get('fertile_window', 'Need more data'),
                          last_period_start=cycle_analysis.get('last_period_start', 'No data'))
 
-@app.route('/parent_dashboard')
-def parent_dashboard():
-    if 'parent_user_id' not in session or not session.get('is_parent'):
+def make_conditional_response(body, *etag_parts):
+    """Return body with an ETag from etag_parts, or 304 if the client has it"""
+    response = make_response(body)
+    response.set_etag(hashlib.md5(repr(etag_parts).encode()).hexdigest())
+    return response.make_conditional(request)
+
+@app.route('/dashboard')
+def dashboard():
+    if 'user_id' not in session or session.get('is_parent'):
         return redirect(url_for('login'))
     
-    users = load_json(USERS_FILE)
-    logs = load_json(LOGS_FILE)
+    user_id = session['user_id']
+    if user_id not in load_json(USERS_FILE):
+        return redirect(url_for('login'))
     
-    user_id = session['parent_user_id']
-    today = datetime.now().strftime('%Y-%m-%d')
+    today = g.today
     
-    print(f"Parent dashboard accessed - User: {user_id}, Today: {today}")
+    # Today's log is only created by the first update_log of the day
+    log.debug("Dashboard accessed - User: %s, Today: %s", user_id, today)
     
-    if user_id not in logs or today not in logs[user_id]:
-        today_log = initialize_daily_log()
-    else:
-        today_log = logs[user_id][today]
+    users_version = get_data_version(USERS_FILE)
+    logs_version = get_data_version(get_log_path(user_id))
+    html = render_dashboard('dashboard.html', user_id, today, users_version, logs_version)
+    return make_conditional_response(html, 'dashboard.html', user_id, today,
+                                     users_version, logs_version)
+
+@app.route('/parent_dashboard')
+def parent_dashboard():
+    if 'parent_user_id' not in session or not session.get('is_parent'):
+        return redirect(url_for('login'))
     
-    water_percentage = min((today_log['water_ml'] / 4000) * 100, 100)
+    user_id = session['parent_user_id']
+    if user_id not in load_json(USERS_FILE):
+        return redirect(url_for('login'))
     
-    # Get period history for predictions
-    period_history = []
-    period_calendar = []
-    period_delay = None
-    cycle_analysis = {}
+    today = g.today
     
-    if users[user_id].get('gender') == 'female':
-        if user_id in logs:
-            for date, log_data in logs[user_id].items():
-                if log_data['period']['start']:
-                    period_history.append({
-                        'date': date,
-                        'start': log_data['period']['start']
-                    })
-        
-        cycle_analysis = calculate_cycle_analysis(period_history)
-        next_period_prediction = predict_next_period(period_history, cycle_analysis['cycle_length'])
-        period_calendar = calculate_period_calendar(
-            period_history, 
-            cycle_analysis['cycle_length'], 
-            cycle_analysis['period_duration']
-        )
-        period_delay = get_period_delay(next_period_prediction)
-    else:
-        next_period_prediction = None
-        period_calendar = []
-        period_delay = None
-        cycle_analysis = {}
+    log.debug("Parent dashboard accessed - User: %s, Today: %s", user_id, today)
     
-    return render_template('parent_dashboard.html',
-                         user=users[user_id],
-                         today_log=today_log,
-                         water_percentage=water_percentage,
-                         next_period_prediction=next_period_prediction,
-                         period_calendar=period_calendar,
-                         period_delay=period_delay,
-                         cycle_length=cycle_analysis.get('cycle_length', 28),
-                         period_duration=cycle_analysis.get('period_duration', 5),
-                         cycle_regularity=cycle_analysis.get('cycle_regularity', 'Insufficient data'),
-                         next_ovulation=cycle_analysis.get('next_ovulation', 'Need more data'),
-                         fertile_window=cycle_analysis.get('fertile_window', 'Need more data'),
-                         last_period_start=cycle_analysis.get('last_period_start', 'No data'))
+    users_version = get_data_version(USERS_FILE)
+    logs_version = get_data_version(get_log_path(user_id))
+    html = render_dashboard('parent_dashboard.html', user_id, today, users_version, logs_version)
+    return make_conditional_response(html, 'parent_dashboard.html', user_id, today,
+                                     users_version, logs_version)
 
 @app.route('/update_log', methods=['POST'])
 def update_log():
@@ -464,38 +740,36 @@ def update_log():
         return jsonify({'success': False, 'error': 'Unauthorized'})
     
     user_id = session['user_id']
-    today = datetime.now().strftime('%Y-%m-%d')
-    data = request.get_json()
-    
-    print(f"Updating log for user: {user_id}, date: {today}")
+    if user_id not in load_json(USERS_FILE):
+        return jsonify({'success': False, 'error': 'Unauthorized'})
     
-    logs = load_json(LOGS_FILE)
+    today = g.today
+    data = request.get_json()
     
-    if user_id not in logs:
-        logs[user_id] = {}
+    log.debug("Updating log for user: %s, date: %s", user_id, today)
     
-    if today not in logs[user_id]:
-        logs[user_id][today] = initialize_daily_log()
+    current_time = get_current_time()
     
-    # Update specific fields
+    # Collect the changed fields
+    changes = []
     if 'meals' in data:
         for meal_type, meal_content in data['meals'].items():
-            logs[user_id][today]['meals'][meal_type] = meal_content
+            changes.append((f'meals.{meal_type}', meal_content))
     
     if 'water_ml' in data:
-        logs[user_id][today]['water_ml'] = data['water_ml']
+        changes.append(('water_ml', data['water_ml']))
     
     if 'sleep_hours' in data:
-        logs[user_id][today]['sleep_hours'] = data['sleep_hours']
+        changes.append(('sleep_hours', data['sleep_hours']))
     
     if 'tasks' in data:
-        logs[user_id][today]['tasks'] = data['tasks']
+        changes.append(('tasks', data['tasks']))
     
     if 'period' in data:
-        logs[user_id][today]['period'].update(data['period'])
+        for period_field, value in data['period'].items():
+            changes.append((f'period.{period_field}', value))
     
     # Update timestamps
-    current_time = get_current_time()
     if 'update_type' in data:
         update_type = data['update_type']
         # Map meal types to timestamp fields
@@ -508,24 +782,34 @@ def update_log():
         
         if update_type in timestamp_mapping:
             timestamp_field = timestamp_mapping[update_type]
-            logs[user_id][today]['last_updated'][timestamp_field] = current_time
-        elif update_type in logs[user_id][today]['last_updated']:
-            logs[user_id][today]['last_updated'][update_type] = current_time
-    
-    # Save the updated logs
-    if save_json(LOGS_FILE, logs):
-        print(f"Log update successful for user: {user_id}")
-        return jsonify({'success': True, 'timestamp': current_time})
-    else:
-        print(f"Log update failed for user: {user_id}")
-        return jsonify({'success': False, 'error': 'Failed to save data'})
+            changes.append((f'last_updated.{timestamp_field}', current_time))
+        elif update_type in _DAILY_LOG_TEMPLATE['last_updated']:
+            changes.append((f'last_updated.{update_type}', current_time))
+    
+    timestamp = g.now.strftime('%Y-%m-%d %H:%M:%S')
+    records = [{'date': today, 'field': field, 'value': value, 'ts': timestamp}
+               for field, value in changes]
+    
+    with _WRITE_LOCK:
+        # Compact the log file on the user's first update of the day
+        user_logs = load_user_logs(user_id)
+        if user_logs and today not in user_logs:
+            compact_user_logs(user_id, user_logs)
+        
+        # Append only the changes instead of rewriting the whole history
+        if not append_log_records(user_id, records):
+            log.error("Log update failed for user: %s", user_id)
+            return jsonify({'success': False, 'error': 'Failed to save data'})
+    
+    log.debug("Log update successful for user: %s", user_id)
+    return jsonify({'success': True, 'timestamp': current_time})
 
-def predict_next_period(period_history, cycle_length=28):
-    if len(period_history) < 1:
+def predict_next_period(period_dates, cycle_length=28):
+    if len(period_dates) < 1:
         return "Need more data for prediction"
     
     # Use the last period as reference
-    last_period = datetime.strptime(period_history[-1]['start'], '%Y-%m-%d')
+    last_period = period_dates[-1].item()
     
     # Calculate next period based on cycle length
     next_predicted = last_period + timedelta(days=cycle_length)
@@ -541,23 +825,26 @@ def debug_files():
     debug_info = {
         'base_dir': BASE_DIR,
         'users_file': USERS_FILE,
-        'logs_file': LOGS_FILE,
+        'logs_dir': LOGS_DIR,
         'users_file_exists': os.path.exists(USERS_FILE),
-        'logs_file_exists': os.path.exists(LOGS_FILE),
+        'logs_dir_exists': os.path.exists(LOGS_DIR),
         'data_dir_exists': os.path.exists(BASE_DIR),
     }
     
     if os.path.exists(USERS_FILE):
-        users = load_json(USERS_FILE)
+        users = get_top_level_keys(USERS_FILE)
         debug_info['users_count'] = len(users)
-        debug_info['users'] = list(users.keys())
+        debug_info['users'] = users
     
-    if os.path.exists(LOGS_FILE):
-        logs = load_json(LOGS_FILE)
-        debug_info['logs_count'] = len(logs)
-        debug_info['logs_users'] = list(logs.keys())
+    if os.path.exists(LOGS_DIR):
+        logs_users = [os.path.splitext(name)[0] for name in os.listdir(LOGS_DIR)
+                      if name.endswith('.jsonl')]
+        debug_info['logs_count'] = len(logs_users)
+        debug_info['logs_users'] = logs_users
     
-    return jsonify(debug_info)
+    logs_dir_version = os.stat(LOGS_DIR).st_mtime if os.path.exists(LOGS_DIR) else None
+    return make_conditional_response(jsonify(debug_info),
+                                     get_data_version(USERS_FILE), logs_dir_version)
 
 @app.route('/logout')
 def logout():
@@ -566,7 +853,7 @@ def logout():
 
 if __name__ == '__main__':
     print("Health Tracker Application Started!")
-    print(f"Data directory: {BASE_DIR}")
-    print(f"Users file: {USERS_FILE}")
-    print(f"Logs file: {LOGS_FILE}")
+    log.info("Data directory: %s", BASE_DIR)
+    log.info("Users file: %s", USERS_FILE)
+    log.info("Logs directory: %s", LOGS_DIR)
     app.run(debug=True)
\ No newline at end of file